@@ -1,36 +1,25 @@
+import heapq
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import pandas as pd
 import numpy as np
-import requests
+import pulp
 
-API = "https://fantasy.premierleague.com/api"
+from fpl_api import bootstrap, fixtures, get_team
 
 # --------------------------
 # Utility functions
 # --------------------------
-@st.cache_data(ttl=900)
-def get_json(url):
-    r = requests.get(url, timeout=10)
-    r.raise_for_status()
-    return r.json()
-
-def bootstrap():
-    return get_json(f"{API}/bootstrap-static/")
-
-def fixtures():
-    return get_json(f"{API}/fixtures/")
-
-def get_team(team_id, gw=None):
-    if gw is None:
-        return get_json(f"{API}/my-team/{team_id}/")
-    else:
-        return get_json(f"{API}/entry/{team_id}/event/{gw}/picks/")
-
-def safe_float(x):
-    try:
-        return float(x)
-    except (TypeError, ValueError):
-        return 0.0
+def name_match_mask(names_lower, raw):
+    """Vectorized substring match of comma-separated names against a lowercased name Series."""
+    wanted = [n.strip().lower() for n in raw.split(",") if n.strip()]
+    if not wanted:
+        return pd.Series(False, index=names_lower.index)
+    pat = "|".join(re.escape(n) for n in wanted)
+    return names_lower.str.contains(pat, regex=True, na=False)
 
 # --------------------------
 # Sidebar controls
@@ -42,53 +31,93 @@ horizon = st.sidebar.slider("GW horizon (weighted)", 1, 3, 3)
 projection_mode = st.sidebar.radio("Projection mode", ["Weighted (default)", "Raw FPL ep_next"])
 free_transfers = st.sidebar.selectbox("Free transfers available", [1,2], index=0)
 allow_hits = st.sidebar.checkbox("Allow -4 hits?", True)
+lock_names = st.sidebar.text_input("Lock players (comma-separated)", "")
+exclude_names = st.sidebar.text_input("Exclude players (comma-separated)", "")
+budget = st.sidebar.slider("Budget (£m)", 80.0, 120.0, 100.0, 0.5)
 
 # --------------------------
-# Load data
+# Load data / build features
 # --------------------------
-boot = bootstrap()
-players = pd.DataFrame(boot["elements"])
-teams = pd.DataFrame(boot["teams"])
-fixtures_df = pd.DataFrame(fixtures())
+@st.cache_data(ttl=900, show_spinner=False)
+def build_features(horizon):
+    """Fetch bootstrap + fixtures and assemble the scored-feature frame.
 
-# map team names
-team_map = dict(zip(teams.id, teams.name))
-players["team_name"] = players["team"].map(team_map)
+    Cached across Streamlit reruns (keyed by horizon) so widget ticks only
+    redo the cheap score arithmetic and solver, not the pandas rebuild.
+    """
+    # bootstrap and fixtures are independent round-trips - overlap them so a
+    # cold start pays for the slower of the two, not the sum
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_boot = ex.submit(bootstrap)
+        f_fix = ex.submit(fixtures)
+        boot, fix = f_boot.result(), f_fix.result()
 
-# map element_type -> position label and order
-pos_map = {1: "GKP", 2: "DEF", 3: "MID", 4: "FWD"}
-pos_order_map = {"GKP": 0, "DEF": 1, "MID": 2, "FWD": 3}
-players["Pos"] = players["element_type"].map(pos_map)
-players["PosOrder"] = players["Pos"].map(pos_order_map)
+    # build only the columns we use - bootstrap elements carry ~60 fields and
+    # every downstream copy/merge would drag the unused ones along
+    needed = ["id", "first_name", "second_name", "web_name", "team",
+              "element_type", "now_cost", "form", "points_per_game",
+              "ep_next", "chance_of_playing_next_round", "status",
+              "total_points"]
+    players = pd.DataFrame({k: [e.get(k) for e in boot["elements"]] for k in needed})
+    teams = pd.DataFrame(boot["teams"])
+    types = pd.DataFrame(boot["element_types"])
+    fixtures_df = pd.DataFrame(fix)
 
-# --------------------------
-# Weighted scoring
-# --------------------------
-def weighted_score(pid, horizon=horizon):
-    row = players.loc[players["id"]==pid].iloc[0]
+    # small-domain integer keys: .map(dict) attaches the scalar columns
+    # directly, no general-purpose merge machinery
+    team_map = dict(zip(teams.id, teams.name))
+    team_short_map = dict(zip(teams.id, teams.short_name))
+    players["team_name"] = players["team"].map(team_map).astype("category")
+    players["team_short"] = players["team"].map(team_short_map).astype("category")
+
+    # position labels straight from the API's element_types table; ordered
+    # categorical so sorts run on integer codes and give GK -> DEF -> MID -> FWD
+    type_short_map = dict(zip(types.id, types.singular_name_short))
+    players["Pos"] = pd.Categorical(players["element_type"].map(type_short_map),
+                                    categories=["GKP", "DEF", "MID", "FWD"],
+                                    ordered=True)
+    # single-pass concat; three chained + ops would allocate two extra Series
+    players["player_name"] = players["first_name"].str.cat(players["second_name"], sep=" ")
 
-    ep_next = safe_float(row.get("ep_next"))
-    form = safe_float(row.get("form"))
-    ppg = safe_float(row.get("points_per_game"))
+    # average fixture ease per team over the next `horizon` GWs (higher = easier)
+    long_fix = pd.concat([
+        fixtures_df[["event", "team_h", "team_h_difficulty"]].rename(
+            columns={"team_h": "team_id", "team_h_difficulty": "difficulty"}),
+        fixtures_df[["event", "team_a", "team_a_difficulty"]].rename(
+            columns={"team_a": "team_id", "team_a_difficulty": "difficulty"}),
+    ], ignore_index=True).sort_values("event")
+    # first `horizon` fixtures per team (long_fix is event-sorted), then one C-level mean
+    next_fix = long_fix.groupby("team_id").head(horizon)
+    avg_diff_map = (6 - next_fix.groupby("team_id")["difficulty"].mean()).to_dict()
+    players["avg_diff"] = players["team"].map(avg_diff_map).fillna(3.0)
 
-    # fixture difficulty (next horizon GWs)
-    next_fix = fixtures_df[(fixtures_df["team_h"]==row["team"]) | (fixtures_df["team_a"]==row["team"])]
-    diffs = []
-    for gw in range(horizon):
-        try:
-            fdr = next_fix.iloc[gw]["team_h_difficulty"] if next_fix.iloc[gw]["team_h"]==row["team"] else next_fix.iloc[gw]["team_a_difficulty"]
-            diffs.append(6 - safe_float(fdr))  # higher = easier
-        except Exception:
-            pass
-    avg_diff = np.mean(diffs) if diffs else 3.0
+    # numeric feature columns (FPL serves these as strings)
+    players["ep_next_f"] = pd.to_numeric(players["ep_next"], errors="coerce").fillna(0)
+    players["form_f"] = pd.to_numeric(players["form"], errors="coerce").fillna(0)
+    players["ppg_f"] = pd.to_numeric(players["points_per_game"], errors="coerce").fillna(0)
 
-    return 0.5*ep_next + 0.3*form + 0.2*ppg + 0.2*avg_diff
+    return players
+
+players = build_features(horizon)
+
+# lock / exclude by name (single vectorized match, not a per-row loop);
+# widget-dependent, so outside the cached feature build
+lower_names = players["player_name"].str.lower()
+players["is_locked"] = name_match_mask(lower_names, lock_names)
+exclude_mask = name_match_mask(lower_names, exclude_names)
+players = players[~exclude_mask]
+
+# --------------------------
+# Weighted scoring (vectorized)
+# --------------------------
+SCORE_WEIGHTS = np.array([0.5, 0.3, 0.2, 0.2])  # ep_next, form, ppg, fixture ease
 
-# assign scores
 if projection_mode == "Raw FPL ep_next":
-    players["score"] = players["ep_next"].apply(safe_float)
+    players["score"] = players["ep_next_f"]
 else:
-    players["score"] = players["id"].apply(weighted_score)
+    # single fused matvec over the raw float arrays - no per-term Series temporaries
+    feats = players[["ep_next_f", "form_f", "ppg_f", "avg_diff"]].to_numpy(dtype=np.float64)
+    players["score"] = feats @ SCORE_WEIGHTS
 
 # --------------------------
 # Info / Legend
@@ -107,8 +136,9 @@ st.write("""
 # Debug table (cleaned)
 # --------------------------
 with st.expander("🔍 Player Projections Debug"):
+    # .copy() needed: the price edit below would trip SettingWithCopyWarning
     dbg = players[[
-        "web_name","team_name","Pos","PosOrder","now_cost",
+        "web_name","team_name","Pos","now_cost",
         "form","points_per_game","ep_next","score"
     ]].copy()
 
@@ -125,10 +155,9 @@ with st.expander("🔍 Player Projections Debug"):
         "score": "OurScore"
     }, inplace=True)
 
-    # order: GK -> DEF -> MID -> FWD, then by OurScore desc
-    dbg = dbg.sort_values(["PosOrder","OurScore"], ascending=[True, False]).reset_index(drop=True)
-    # hide helper column PosOrder from display
-    st.dataframe(dbg.drop(columns=["PosOrder"]).head(50))
+    # order: GK -> DEF -> MID -> FWD (categorical order), then by OurScore desc
+    dbg = dbg.sort_values(["Pos","OurScore"], ascending=[True, False]).reset_index(drop=True)
+    st.dataframe(dbg.head(50))
 
 # --------------------------
 # Backtest helper
@@ -136,13 +165,16 @@ with st.expander("🔍 Player Projections Debug"):
 st.sidebar.markdown("---")
 gw_back = st.sidebar.number_input("Backtest: pick past GW", min_value=0, max_value=38, value=0)
 
+# id-indexed view for O(1) player lookups (e.g. backtest picks)
+players_by_id = players.set_index("id", drop=False)
+
 if team_id and gw_back > 0:
     try:
         hist = get_team(team_id, gw_back)
         picks = pd.DataFrame(hist["picks"])
         st.subheader(f"📊 Backtest GW{gw_back}")
         st.write("Predicted vs Actual points for your XI (approximate)")
-        merged = picks.merge(players, left_on="element", right_on="id", how="left")
+        merged = players_by_id.reindex(picks["element"]).reset_index(drop=True)
         merged["Predicted"] = merged["score"]
         merged["Actual"] = merged["total_points"]
         out = merged[["web_name","Predicted","Actual"]].rename(columns={"web_name":"Name"})
@@ -151,7 +183,132 @@ if team_id and gw_back > 0:
         st.warning(f"Could not load backtest data: {e}")
 
 # --------------------------
-# Placeholder for transfer logic
+# Optimal squad (MILP)
 # --------------------------
-st.subheader("🚧 Transfer planner logic will plug in here")
-st.info("Positions and ordering fixed. Next step: re-add the transfer engine.")
+st.subheader("🤖 Optimal 15-man Squad")
+
+# FPL squad quotas and valid-formation bounds for the XI
+SQUAD_QUOTA = {"GKP": 2, "DEF": 5, "MID": 5, "FWD": 3}
+XI_MIN = {"GKP": 1, "DEF": 3, "MID": 2, "FWD": 1}
+XI_MAX = {"GKP": 1, "DEF": 5, "MID": 5, "FWD": 3}
+
+# Prune the candidate pool before handing it to CBC - solve time grows
+# super-linearly with the number of binaries. A player can only be dropped
+# safely if as many cheaper-or-equal clubmates in the same position score at
+# least as well as could ever be picked together (club cap / position quota);
+# beyond that, only the top scorers per position - plus the cheapest few, who
+# enable expensive stars under a tight budget - can make the squad. Locked
+# players always survive the pruning.
+TOP_K = {"GKP": 10, "DEF": 40, "MID": 50, "FWD": 30}
+CHEAP_K = 5
+
+def _dominated(scores, m):
+    """True where at least m earlier (cheaper) scores are >= this score."""
+    top = []  # min-heap of the m best scores seen so far
+    out = []
+    for s in scores:
+        out.append(len(top) == m and top[0] >= s)
+        if len(top) < m:
+            heapq.heappush(top, s)
+        elif s > top[0]:
+            heapq.heapreplace(top, s)
+    return out
+
+pool = players.sort_values(["Pos", "team_short", "now_cost", "score"],
+                           ascending=[True, True, True, False])
+dominated = pd.Series(False, index=pool.index)
+for (pos, club), grp in pool.groupby(["Pos", "team_short"], observed=True):
+    m = min(SQUAD_QUOTA[pos], 3)  # max same-club picks in this position
+    dominated.loc[grp.index] = _dominated(grp["score"].to_numpy(), m)
+
+pool = pool[~dominated | pool["is_locked"]]
+pool = pool.sort_values("score", ascending=False)
+# .map on a categorical yields a categorical - cast back to int for the compare
+in_top_k = pool.groupby("Pos", observed=True).cumcount() < pool["Pos"].map(TOP_K).astype(int)
+is_cheap = pool["now_cost"].groupby(pool["Pos"], observed=True).rank(method="first") <= CHEAP_K
+pool = pool[in_top_k | is_cheap | pool["is_locked"]]
+
+opt = pool.reset_index(drop=True)
+idx = list(opt.index)
+
+# idx is a contiguous 0..N-1 range after reset_index, so plain NumPy arrays
+# serve as the attribute tables - C-speed indexing, no dict/hash overhead
+cost = opt["now_cost"].to_numpy() / 10   # £m
+score = opt["score"].to_numpy()
+locked = opt["is_locked"].to_numpy()
+
+# index buckets: one groupby each instead of re-scanning idx per constraint
+pos_idx = opt.groupby("Pos", observed=True).groups
+club_idx = opt.groupby("team_short", observed=True).groups
+
+P = pulp.LpProblem("fpl_squad", pulp.LpMaximize)
+x = pulp.LpVariable.dicts("x", idx, cat="Binary")   # in 15-man squad
+y = pulp.LpVariable.dicts("y", idx, cat="Binary")   # in starting XI
+c = pulp.LpVariable.dicts("c", idx, cat="Binary")   # captain (scores double)
+
+P += pulp.lpSum((y[i] + c[i]) * score[i] for i in idx)
+
+P += pulp.lpSum(x[i] * cost[i] for i in idx) <= budget
+P += pulp.lpSum(x[i] for i in idx) == 15
+P += pulp.lpSum(y[i] for i in idx) == 11
+P += pulp.lpSum(c[i] for i in idx) == 1
+
+for pos, quota in SQUAD_QUOTA.items():
+    members = pos_idx.get(pos, [])
+    P += pulp.lpSum(x[i] for i in members) == quota
+    P += pulp.lpSum(y[i] for i in members) >= XI_MIN[pos]
+    P += pulp.lpSum(y[i] for i in members) <= XI_MAX[pos]
+
+for club, members in club_idx.items():
+    P += pulp.lpSum(x[i] for i in members) <= 3
+
+for i in idx:
+    P += y[i] <= x[i]
+    P += c[i] <= y[i]
+    if locked[i]:
+        P += x[i] == 1
+
+# multi-core CBC with a 0.5% gap cutoff: closing the last fraction of the
+# gap costs most of the solve time and never changes the squad meaningfully
+P.solve(pulp.PULP_CBC_CMD(msg=False, threads=os.cpu_count(),
+                          gapRel=0.005, timeLimit=10))
+
+# a time-limit stop reports "Not Solved" but can still carry a feasible
+# incumbent - use it rather than discarding a perfectly good squad
+solved = P.status == pulp.LpStatusOptimal or (
+    P.status == pulp.LpStatusNotSolved
+    and sum((x[i].varValue or 0.0) > 0.5 for i in idx) == 15
+)
+
+if solved:
+    # read varValue directly - pulp.value() adds a type-dispatch layer per call
+    for col, var in (("in_squad", x), ("in_xi", y), ("is_captain", c)):
+        vals = np.fromiter((var[i].varValue or 0.0 for i in idx),
+                           dtype=np.float64, count=len(idx))
+        opt[col] = (vals > 0.5).astype(np.int8)
+
+    squad = opt[opt["in_squad"] == 1].copy()
+    squad["Name"] = np.where(squad["is_captain"] == 1,
+                             squad["web_name"] + " (C)", squad["web_name"])
+    squad["Price (£m)"] = squad["now_cost"] / 10
+
+    xi = squad[squad["in_xi"] == 1].sort_values(
+        ["Pos", "score"], ascending=[True, False])
+    bench = squad[squad["in_xi"] == 0]  # only sliced and sorted, never written
+    # bench order: weakest outfielders first, backup GK last (auto-sub order) -
+    # one stable argsort on a keyed array, no slicing or concat
+    bench_key = np.where(bench["Pos"] == "GKP", np.inf, bench["score"])
+    bench_order = bench.iloc[np.argsort(bench_key, kind="stable")]
+
+    show_cols = ["Name", "team_short", "Pos", "Price (£m)", "score"]
+    projected = xi["score"].sum() + squad.loc[squad["is_captain"] == 1, "score"].sum()
+    st.markdown(f"**Starting XI** — projected {projected:.1f} pts "
+                f"(captain doubled), squad cost £{squad['Price (£m)'].sum():.1f}m")
+    st.dataframe(xi[show_cols].rename(columns={"team_short": "Team", "score": "OurScore"})
+                 .reset_index(drop=True))
+    st.markdown("**Bench** (auto-sub order)")
+    st.dataframe(bench_order[show_cols].rename(columns={"team_short": "Team", "score": "OurScore"})
+                 .reset_index(drop=True))
+else:
+    st.warning(f"Could not find an optimal squad ({pulp.LpStatus[P.status]}). "
+               "Check your locked players and budget.")
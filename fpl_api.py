@@ -0,0 +1,89 @@
+"""Shared FPL API access: one pooled HTTP session and one set of caches.
+
+Import from here instead of defining per-page fetch helpers so every page
+shares the same st.cache_data keys, the same disk cache and the same
+keep-alive TCP/TLS connection.
+"""
+import hashlib
+import json
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+import streamlit as st
+
+API = "https://fantasy.premierleague.com/api"
+
+
+class FileCache:
+    """Tiny JSON-on-disk cache (keyed by URL hash) so cold Streamlit sessions
+    skip the FPL API round-trip. st.cache_data only memoizes in-process."""
+
+    def __init__(self, root=".cache"):
+        self.root = root
+
+    def _path(self, url):
+        return os.path.join(self.root, hashlib.md5(url.encode()).hexdigest() + ".json")
+
+    def get(self, url, ttl=None):
+        """Return cached JSON for url, or None. ttl=None accepts any age."""
+        path = self._path(url)
+        try:
+            if ttl is not None and time.time() - os.path.getmtime(path) > ttl:
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url, data):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._path(url), "w") as f:
+            json.dump(data, f)
+
+
+disk_cache = FileCache()
+
+
+@st.cache_resource
+def _session():
+    """One pooled requests.Session per process - secondary endpoint calls
+    reuse the TCP/TLS connection instead of paying a fresh handshake."""
+    s = requests.Session()
+    s.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+    return s
+
+
+@st.cache_data(ttl=900, show_spinner=False)
+def get_json(url, disk_ttl=900):
+    cached = disk_cache.get(url, ttl=disk_ttl)
+    if cached is not None:
+        return cached
+    try:
+        r = _session().get(url, timeout=10)
+        r.raise_for_status()
+    except requests.RequestException:
+        # offline / API down: fall back to a stale copy if we have one
+        stale = disk_cache.get(url)
+        if stale is not None:
+            return stale
+        raise
+    data = r.json()
+    disk_cache.put(url, data)
+    return data
+
+
+def bootstrap():
+    return get_json(f"{API}/bootstrap-static/")
+
+
+def fixtures():
+    return get_json(f"{API}/fixtures/", disk_ttl=3600)
+
+
+def get_team(team_id, gw=None):
+    if gw is None:
+        return get_json(f"{API}/my-team/{team_id}/")
+    else:
+        return get_json(f"{API}/entry/{team_id}/event/{gw}/picks/")